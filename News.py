@@ -1,7 +1,9 @@
 # Streamlit app: NSE small-cap news fetcher using GNews (auto-fetch version)
 # Save this file as streamlit_nse_smallcap_news.py and run: streamlit run streamlit_nse_smallcap_news.py
-# Requirements: pip install streamlit requests pandas python-dateutil
+# Requirements: pip install streamlit requests "pandas>=2.0"
 # Optional (for better sentiment): pip install vaderSentiment
+# Optional (cache results across restarts): pip install diskcache
+# Optional (async HTTP/2 fetching): pip install "httpx[http2]" tenacity
 
 """
 How to set your API key (Linux / macOS):
@@ -13,103 +15,480 @@ Notes:
 - This app uses the GNews API (https://gnews.io). The environment variable name is GOOGLE_NEWS_API_KEY.
 - Automatically fetches news on selection change (no button needed).
 - You can supply a CSV file of tickers with two columns: ticker,company_name. Or use the small built-in list.
+- Picking several tickers under "Combine tickers" fetches them with batched OR queries to save API quota.
 """
 
+import asyncio
+import functools
+import hashlib
+import html
+import io
 import os
+import random
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import closing
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import requests
 import streamlit as st
-from dateutil import parser
+from requests.adapters import HTTPAdapter
+
+@st.cache_resource
+def _load_vader():
+    # Parsing the VADER lexicon is the expensive part; do it once per process, not on every rerun
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+@st.cache_resource
+def _vader_compound():
+    scorer = _load_vader()
+
+    # Memoised per text so reruns don't rescore articles that were already scored
+    @functools.lru_cache(maxsize=4096)
+    def compound(text: str) -> float:
+        return scorer.polarity_scores(text)["compound"]
+    return compound
 
 # Optional sentiment (lightweight heuristic)
 try:
-    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-    analyzer = SentimentIntensityAnalyzer()
+    _load_vader()
     VADER_AVAILABLE = True
 except Exception:
     VADER_AVAILABLE = False
-    POS_WORDS = set(["good","up","gain","positive","beat","outperform","buy","profit","growth","record","surge","rise","benefit","upgrade"])
-    NEG_WORDS = set(["loss","down","drop","decline","miss","warn","sell","fall","slump","delay","cut"])
+    POS_WORDS = frozenset(["good","up","gain","positive","beat","outperform","buy","profit","growth","record","surge","rise","benefit","upgrade"])
+    NEG_WORDS = frozenset(["loss","down","drop","decline","miss","warn","sell","fall","slump","delay","cut"])
+    # One pattern per word, matched only as a whole [a-z'] token so e.g. "goodbye" doesn't count as "good"
+    POS_PATTERNS = [rf"(?<![a-z']){re.escape(w)}(?![a-z'])" for w in POS_WORDS]
+    NEG_PATTERNS = [rf"(?<![a-z']){re.escape(w)}(?![a-z'])" for w in NEG_WORDS]
 
-def simple_sentiment(text: str) -> str:
-    if not text:
-        return "neutral"
+def vector_sentiment(series: pd.Series) -> pd.Series:
+    """Label each text positive/negative/neutral for a whole Series with vectorised string ops."""
     if VADER_AVAILABLE:
-        score = analyzer.polarity_scores(text)["compound"]
-        if score >= 0.05:
-            return "positive"
-        elif score <= -0.05:
-            return "negative"
-        else:
-            return "neutral"
-    text = text.lower()
-    pos = sum(w in text for w in POS_WORDS)
-    neg = sum(w in text for w in NEG_WORDS)
-    if pos > neg:
-        return "positive"
-    elif neg > pos:
-        return "negative"
+        compound = _vader_compound()
+        scores = np.fromiter((compound(t) for t in series.tolist()), dtype=float, count=len(series))
+        labels = np.select([scores >= 0.05, scores <= -0.05], ["positive", "negative"], default="neutral")
     else:
-        return "neutral"
+        # Count distinct lexicon words per row; repeating a word doesn't add weight
+        text = series.str.lower()
+        pos = sum(text.str.contains(p, regex=True, na=False).to_numpy(dtype=int) for p in POS_PATTERNS)
+        neg = sum(text.str.contains(p, regex=True, na=False).to_numpy(dtype=int) for p in NEG_PATTERNS)
+        labels = np.select([pos > neg, neg > pos], ["positive", "negative"], default="neutral")
+    return pd.Series(labels, index=series.index)
 
 GNEWS_SEARCH_URL = "https://gnews.io/api/v4/search"
+ARTICLE_COLUMNS = ["title", "description", "url", "source", "publishedAt"]
+
+class _MemoryCache:
+    """In-process stand-in for diskcache.Cache (get / set with expire) when diskcache isn't installed."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires = self._items.get(key, (None, 0.0))
+            return value if expires > time.monotonic() else None
+
+    def set(self, key, value, expire):
+        now = time.monotonic()
+        with self._lock:
+            self._items = {k: v for k, v in self._items.items() if v[1] > now}
+            self._items[key] = (value, now + expire)
+
+@st.cache_resource
+def _open_news_cache():
+    # cache_resource keeps one instance across script reruns, which the in-memory fallback relies on
+    try:
+        import diskcache
+        return diskcache.Cache(".gnews_cache")
+    except ImportError:
+        return _MemoryCache()
+
+# Results cache shared by every fetch path: persistent with diskcache, so identical queries survive app restarts
+NEWS_CACHE = _open_news_cache()
+NEWS_CACHE_TTL = 20 * 60
+# Results cut short by a 429/5xx on a later page are kept briefly too, so reruns don't hammer GNews
+PARTIAL_CACHE_TTL = 5 * 60
+
+@st.cache_resource
+def _open_session() -> requests.Session:
+    # One pooled session per process, so connections are reused across reruns, not just within one.
+    # Sized for the main fetch (up to 4 concurrent pages after page 1) plus PREFETCH_WORKERS doing the same.
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16))
+    return session
+
+SESSION = _open_session()
+
+# Optional async transport: the requests of one open_transport() share a single HTTP/2 client
+try:
+    import h2  # noqa: F401 -- httpx needs it for http2=True
+    import httpx
+    import tenacity
+    HTTPX_AVAILABLE = True
+except Exception:
+    HTTPX_AVAILABLE = False
+
+MAX_RETRIES = 5
+RETRY_STATUSES = (429, 500, 503)
+# Longer Retry-After waits (e.g. an exhausted daily quota) aren't worth blocking the UI for
+MAX_RETRY_AFTER = 60
+
+def _retry_after(headers) -> Optional[int]:
+    """Seconds requested by the server's Retry-After header, if it sent a numeric one."""
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        return None
+
+def _backoff_delay(retries: int, retry_after: Optional[int] = None) -> float:
+    # Full jitter: concurrent sessions sharing one GNews quota must not retry in lockstep.
+    base = min(60, 0.5 * 2 ** retries)
+    delay = random.uniform(0, base)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, MAX_RETRY_AFTER))
+    return delay
+
+def _normalize_article(a: Dict, fetch_content: bool) -> Dict:
+    article = {
+        "title": a.get("title"),
+        "description": a.get("description"),
+        "url": a.get("url"),
+        "source": a.get("source", {}).get("name"),
+        "publishedAt": a.get("publishedAt"),
+    }
+    # Full content is never displayed; only keep it when explicitly asked for
+    if fetch_content:
+        article["content"] = a.get("content")
+    return article
+
+class _PageFailed:
+    """Stands in for a page's article list when the page could not be fetched."""
+    def __init__(self, transient: bool):
+        # transient: 429/5xx retries ran out, so the same request may well succeed shortly
+        self.transient = transient
+
+PAGE_FAILED = _PageFailed(transient=False)
+PAGE_RATE_LIMITED = _PageFailed(transient=True)
+
+def _ends_fetch(articles, page_size: int) -> bool:
+    """A failed or short page means there is nothing worth fetching after it."""
+    return isinstance(articles, _PageFailed) or len(articles) < page_size
+
+def _fetch_page(base_params: Dict, page: int, fetch_content: bool,
+                stop: threading.Event) -> Tuple[int, Union[List[Dict], _PageFailed]]:
+    """Fetch one result page. Returns (page, articles), with a _PageFailed on failure or when skipped."""
+    params = {**base_params, "page": page}
+    retries = 0
+    while not stop.is_set():
+        try:
+            resp = SESSION.get(GNEWS_SEARCH_URL, params=params, timeout=15)
+            if resp.status_code == 200:
+                data = resp.json()
+                return page, [_normalize_article(a, fetch_content) for a in data.get("articles", [])]
+            elif resp.status_code in RETRY_STATUSES:
+                retries += 1
+                retry_after = _retry_after(resp.headers)
+                if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                    return page, PAGE_FAILED
+                if retries > MAX_RETRIES:
+                    return page, PAGE_RATE_LIMITED
+                stop.wait(_backoff_delay(retries, retry_after))
+                continue
+            else:
+                return page, PAGE_FAILED
+        except Exception:
+            retries += 1
+            if retries > MAX_RETRIES:
+                return page, PAGE_FAILED
+            stop.wait(_backoff_delay(retries))
+    return page, PAGE_FAILED
+
+class _RetryableStatus(Exception):
+    """A 429/5xx response on the async path; raised so tenacity schedules a retry."""
+    def __init__(self, status_code: int, retry_after: Optional[int]):
+        super().__init__(status_code)
+        self.retry_after = retry_after
+
+def _tenacity_wait(retry_state) -> float:
+    # Same jittered schedule as the requests path, so both transports back off alike.
+    exc = retry_state.outcome.exception()
+    return _backoff_delay(retry_state.attempt_number, getattr(exc, "retry_after", None))
+
+async def _afetch_page(client, params: Dict, fetch_content: bool) -> Union[List[Dict], _PageFailed]:
+    retrying = tenacity.AsyncRetrying(
+        stop=tenacity.stop_after_attempt(MAX_RETRIES + 1),
+        wait=_tenacity_wait,
+        retry=tenacity.retry_if_exception_type((_RetryableStatus, httpx.TransportError)),
+        reraise=True,
+    )
+    try:
+        async for attempt in retrying:
+            with attempt:
+                resp = await client.get(GNEWS_SEARCH_URL, params=params)
+                if resp.status_code in RETRY_STATUSES:
+                    retry_after = _retry_after(resp.headers)
+                    if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                        return PAGE_FAILED
+                    raise _RetryableStatus(resp.status_code, retry_after)
+        if resp.status_code != 200:
+            return PAGE_FAILED
+        data = resp.json()
+        return [_normalize_article(a, fetch_content) for a in data.get("articles", [])]
+    except _RetryableStatus:
+        return PAGE_RATE_LIMITED
+    except Exception:
+        return PAGE_FAILED
+
+def _iter_pages_threaded(base_params: Dict, pages: range, page_size: int,
+                         fetch_content: bool) -> Iterator[Union[List[Dict], _PageFailed]]:
+    # Pages are fetched concurrently; once a page comes back short (or fails) every
+    # later page is pointless, so their events tell those workers to give up early.
+    stops = {page: threading.Event() for page in pages}
+    results = {}
+    next_page = pages.start
+    with ThreadPoolExecutor(max_workers=len(pages)) as pool:
+        try:
+            futures = [
+                pool.submit(_fetch_page, base_params, page, fetch_content, stops[page])
+                for page in pages
+            ]
+            for fut in as_completed(futures):
+                page, articles = fut.result()
+                results[page] = articles
+                if _ends_fetch(articles, page_size):
+                    for later in range(page + 1, pages.stop):
+                        stops[later].set()
+                while next_page in results:
+                    yield results.pop(next_page)
+                    next_page += 1
+        finally:
+            # If the consumer closes us early, wake any worker sleeping in backoff so the
+            # pool's shutdown doesn't wait it out
+            for stop in stops.values():
+                stop.set()
+
+class _ThreadedTransport:
+    """Page fetching over the pooled requests SESSION; nothing to set up or tear down."""
+
+    def iter_pages(self, base_params: Dict, pages: range, page_size: int,
+                   fetch_content: bool) -> Iterator[Union[List[Dict], _PageFailed]]:
+        return _iter_pages_threaded(base_params, pages, page_size, fetch_content)
+
+    def close(self) -> None:
+        pass
 
-@st.cache_data(ttl=60*5)
-def cached_fetch_news(query: str, from_iso: str, to_iso: str, max_pages: int = 3, page_size: int = 50) -> List[Dict]:
+class _AsyncTransport:
+    """One event loop and one HTTP/2 client, shared by every page and query fetched through it.
+
+    The loop is driven by hand so each page can be yielded as soon as it and every earlier
+    page are done. Use it from the thread that created it.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._client = httpx.AsyncClient(http2=True, timeout=15)
+
+    def iter_pages(self, base_params: Dict, pages: range, page_size: int,
+                   fetch_content: bool) -> Iterator[Union[List[Dict], _PageFailed]]:
+        loop = self._loop
+        tasks = {}
+        try:
+            tasks = {
+                loop.create_task(_afetch_page(self._client, {**base_params, "page": page}, fetch_content)): page
+                for page in pages
+            }
+            pending = set(tasks)
+            results = {}
+            next_page = pages.start
+            while pending:
+                done, pending = loop.run_until_complete(asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED))
+                for task in done:
+                    page = tasks[task]
+                    results[page] = PAGE_FAILED if task.cancelled() else task.result()
+                    if _ends_fetch(results[page], page_size):
+                        for other in pending:
+                            if tasks[other] > page:
+                                other.cancel()
+                while next_page in results:
+                    yield results.pop(next_page)
+                    next_page += 1
+        finally:
+            unfinished = [task for task in tasks if not task.done()]
+            if unfinished:
+                for task in unfinished:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*unfinished, return_exceptions=True))
+
+    def close(self) -> None:
+        self._loop.run_until_complete(self._client.aclose())
+        self._loop.close()
+
+def open_transport():
+    """Transport for one or more fetches; close it when done (e.g. with contextlib.closing)."""
+    return _AsyncTransport() if HTTPX_AVAILABLE else _ThreadedTransport()
+
+def _page_results(transport, api_key: str, query: str, from_iso: str, to_iso: str, max_pages: int,
+                  page_size: int, fetch_content: bool) -> Iterator[Union[List[Dict], _PageFailed]]:
+    """Yield each page's articles (a _PageFailed on failure) in page order, as soon as that page is ready."""
+    base_params = {"apikey": api_key, "q": query, "from": from_iso, "to": to_iso, "lang": "en", "max": page_size}
+    # Every request costs quota, so page 1 goes out alone; only a full first page means
+    # there is anything on pages 2..N worth fetching concurrently.
+    first_page = transport.iter_pages(base_params, range(1, 2), page_size, fetch_content)
+    first = next(first_page)
+    first_page.close()
+    yield first
+    if _ends_fetch(first, page_size) or max_pages < 2:
+        return
+    yield from transport.iter_pages(base_params, range(2, max_pages + 1), page_size, fetch_content)
+
+def fetch_pages_iter(query: str, from_iso: str, to_iso: str, max_pages: int = 3, page_size: int = 50,
+                     fetch_content: bool = False, transport=None) -> Iterator[List[Dict]]:
+    """Yield article batches page by page so the UI can render before the last page arrives.
+
+    Not cached itself; the fetched articles are stored in NEWS_CACHE and replayed as a single batch.
+    Pass a transport from open_transport() to share connections across several queries.
+    """
     api_key = os.getenv("GOOGLE_NEWS_API_KEY")
     if not api_key:
         raise RuntimeError("Environment variable GOOGLE_NEWS_API_KEY not set.")
 
-    all_articles = []
-    for page in range(1, max_pages + 1):
-        params = {
-            "apikey": api_key,
-            "q": query,
-            "from": from_iso,
-            "to": to_iso,
-            "lang": "en",
-            "max": page_size,
-            "page": page,
-        }
-        retries = 0
-        while True:
-            try:
-                resp = requests.get(GNEWS_SEARCH_URL, params=params, timeout=15)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    articles = data.get("articles", [])
-                    if not articles:
-                        return all_articles
-                    for a in articles:
-                        all_articles.append({
-                            "title": a.get("title"),
-                            "description": a.get("description"),
-                            "content": a.get("content"),
-                            "url": a.get("url"),
-                            "source": a.get("source", {}).get("name"),
-                            "publishedAt": a.get("publishedAt"),
-                        })
-                    if len(articles) < page_size:
-                        return all_articles
-                    break
-                elif resp.status_code in (429, 500, 503):
-                    retries += 1
-                    if retries > 3:
-                        return all_articles
-                    time.sleep(2 ** retries)
-                    continue
-                else:
-                    return all_articles
-            except Exception:
-                retries += 1
-                if retries > 3:
-                    return all_articles
-                time.sleep(2 ** retries)
-    return all_articles
+    key = hashlib.sha1(f"{query}|{from_iso}|{to_iso}|{max_pages}|{page_size}|{fetch_content}".encode()).hexdigest()
+    cached = NEWS_CACHE.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    own_transport = transport is None
+    if own_transport:
+        transport = open_transport()
+    try:
+        # Stop at the first failed or short page like the sequential loop did.
+        all_articles = []
+        for articles in _page_results(transport, api_key, query, from_iso, to_iso, max_pages, page_size,
+                                      fetch_content):
+            if isinstance(articles, _PageFailed):
+                # Keep earlier pages briefly only after a rate limit / server error. A page-1 failure,
+                # rejected key or outage is never stored, since the key above doesn't cover those.
+                if articles.transient and all_articles:
+                    NEWS_CACHE.set(key, all_articles, expire=PARTIAL_CACHE_TTL)
+                return
+            all_articles.extend(articles)
+            yield articles
+            if len(articles) < page_size:
+                break
+        NEWS_CACHE.set(key, all_articles, expire=NEWS_CACHE_TTL)
+    finally:
+        if own_transport:
+            transport.close()
+
+PREFETCH_WORKERS = 2
+# Every prefetched ticker costs up to max_pages API calls, so only warm the first few
+PREFETCH_MAX_TICKERS = 10
+
+def prefetch_news(queries: List[str], from_iso: str, to_iso: str, max_pages: int = 3, page_size: int = 50) -> None:
+    """Run fetches only for their side effect of filling NEWS_CACHE; safe off the script thread."""
+    # Opened here so the transport belongs to this worker thread and is shared by all its queries
+    with closing(open_transport()) as transport:
+        for query in queries:
+            for _ in fetch_pages_iter(query, from_iso, to_iso, max_pages, page_size, transport=transport):
+                pass
+
+@st.cache_data
+def load_ticker_csv(csv_bytes: bytes) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """Parse an uploaded ticker CSV into (ticker_map, error).
+
+    Keyed on the file contents, so reruns with the same upload skip the parse. Errors are
+    returned rather than raised because st.cache_data doesn't cache exceptions.
+    """
+    try:
+        # Read everything as text: numeric codes (e.g. BSE 500180) must stay str for joins and
+        # matching, and empty company cells should be "" rather than NaN
+        df = pd.read_csv(io.BytesIO(csv_bytes), dtype=str, keep_default_na=False)
+        df = df.apply(lambda col: col.str.strip())
+        df = df[df.iloc[:, 0] != ""]
+        ticker_map = df.set_index(df.columns[0]).iloc[:, 0].to_dict()
+    except Exception as e:
+        return None, str(e)
+    if not ticker_map:
+        return None, "no tickers found"
+    return ticker_map, None
+
+def dataframe_to_csv(df: pd.DataFrame) -> bytes:
+    # pyarrow ships with streamlit; its columnar writer beats df.to_csv for the download path
+    sink = pa.BufferOutputStream()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), sink)
+    return sink.getvalue().to_pybytes()
+
+SENTIMENT_COLORS = {"positive": "#1a7f37", "negative": "#cf222e", "neutral": "#6e7781"}
+
+def _inline_html(text: str) -> str:
+    # Collapse whitespace first: a blank line inside the block would end CommonMark's HTML block
+    # and hand the rest of the article list to the markdown parser
+    return html.escape(" ".join(text.split()))
+
+def article_html(row: Dict, show_sentiment: bool) -> str:
+    title = _inline_html(row.get('title') or "(No title)")
+    desc = _inline_html(row.get('description') or "")
+    src = _inline_html(row.get('source') or "Unknown")
+    link = row.get('url') or ""
+    parts = [f"<div class=\"art\"><strong>{title}</strong>"]
+    caption = f"{src} — {html.escape(row['date_str'])}"
+    if row.get('ticker'):
+        caption += f" · {_inline_html(row['ticker'])}"
+    parts.append(f"<div style=\"color:gray;font-size:0.875em\">{caption}</div>")
+    if desc:
+        parts.append(f"<p>{desc}</p>")
+    # Only http(s) links are rendered; anything else could run script once HTML is allowed
+    if link.startswith(("http://", "https://")):
+        parts.append(f"<a href=\"{html.escape(link)}\" target=\"_blank\">Read more</a>")
+    if show_sentiment:
+        parts.append(f"<p><strong>Sentiment:</strong> <span style=\"color:{row['sentiment_color']}\">"
+                     f"{html.escape(row.get('sentiment', 'neutral'))}</span></p>")
+    parts.append("<hr/></div>")
+    return "\n".join(parts)
+
+def ticker_query(ticker: str, company_name: str) -> str:
+    if not company_name:
+        return f'"{ticker}"'
+    return f'"{ticker}" OR "{company_name}"'
+
+GNEWS_MAX_QUERY_LEN = 500
+
+def batch_ticker_queries(pairs: List[Tuple[str, str]], max_len: int = GNEWS_MAX_QUERY_LEN) -> List[str]:
+    """OR several tickers into as few GNews queries as fit under the query-length limit."""
+    queries, current = [], ""
+    for t, c in pairs:
+        term = f"({ticker_query(t, c)})"
+        candidate = f"{current} OR {term}" if current else term
+        if current and len(candidate) > max_len:
+            queries.append(current)
+            candidate = term
+        current = candidate
+    if current:
+        queries.append(current)
+    return queries
+
+def tag_tickers(df: pd.DataFrame, pairs: List[Tuple[str, str]]) -> pd.Series:
+    """Comma-separated tickers whose symbol or company name appears in each article's title/description."""
+    text = df['title'].fillna('') + ' ' + df['description'].fillna('')
+    matches = pd.DataFrame({
+        t: text.str.contains(t, case=False, regex=False) | (bool(c) and text.str.contains(c, case=False, regex=False))
+        for t, c in pairs
+    }, index=df.index)
+    return matches.dot(matches.columns + ", ").str.rstrip(", ")
 
 st.set_page_config(page_title="NSE Small-cap News Explorer", layout="wide")
 st.title("📈 NSE Small-cap — Google News Explorer (Auto-Fetch)")
@@ -126,14 +505,9 @@ BUILTIN_SMALLCAPS = [
 
 st.sidebar.header("Ticker Selection")
 upload = st.sidebar.file_uploader("Upload CSV (ticker,company_name) — optional", type=["csv"])
-if upload is not None:
-    try:
-        df = pd.read_csv(upload)
-        ticker_map = dict(zip(df.iloc[:,0], df.iloc[:,1]))
-    except Exception as e:
-        st.sidebar.warning(f"Error reading CSV: {e}. Using built-in list.")
-        ticker_map = dict(BUILTIN_SMALLCAPS)
-else:
+ticker_map, csv_error = load_ticker_csv(upload.getvalue()) if upload is not None else (dict(BUILTIN_SMALLCAPS), None)
+if csv_error:
+    st.sidebar.warning(f"Error reading CSV: {csv_error}. Using built-in list.")
     ticker_map = dict(BUILTIN_SMALLCAPS)
 
 selected_ticker = st.sidebar.selectbox("Select stock ticker", list(ticker_map.keys()))
@@ -141,69 +515,112 @@ company_name = ticker_map[selected_ticker]
 
 range_label = st.sidebar.selectbox("Select date range", ["Last 1 week","Last 1 month","Last 3 months","Last 6 months"])
 now = datetime.utcnow()
+# Snap to a 5-minute boundary so every rerun inside the window builds the same cache key.
+# The window therefore ends up to 5 minutes in the past; the next bucket starts a fresh fetch.
+bucket = now.replace(minute=(now.minute // 5) * 5, second=0, microsecond=0)
 if range_label == "Last 1 week":
-    from_dt = now - timedelta(weeks=1)
+    from_dt = bucket - timedelta(weeks=1)
 elif range_label == "Last 1 month":
-    from_dt = now - timedelta(days=30)
+    from_dt = bucket - timedelta(days=30)
 elif range_label == "Last 3 months":
-    from_dt = now - timedelta(days=90)
+    from_dt = bucket - timedelta(days=90)
 else:
-    from_dt = now - timedelta(days=180)
+    from_dt = bucket - timedelta(days=180)
 
-to_dt = now
+to_dt = bucket
 from_iso, to_iso = from_dt.isoformat()+"Z", to_dt.isoformat()+"Z"
 
 use_sentiment = st.sidebar.checkbox("Show sentiment", value=True)
 max_pages = st.sidebar.slider("Pages",1,5,2)
 page_size = st.sidebar.selectbox("Articles per page", [10,20,50,100], index=2)
 
-query = f'"{selected_ticker}" OR "{company_name}"'
+query = ticker_query(selected_ticker, company_name)
+
+# Warm the cache for the other tickers so clicking through them is instant. This runs again
+# whenever the ticker list (e.g. a new upload) or the fetch window changes, not just once.
+# Fire-and-forget: the workers fill NEWS_CACHE, which fetch_pages_iter checks before fetching.
+# They never call into Streamlit, so they need no ScriptRunContext.
+prefetch_key = (tuple(ticker_map.items()), from_iso, to_iso, max_pages, page_size)
+if st.session_state.get("_prefetched") != prefetch_key:
+    st.session_state["_prefetched"] = prefetch_key
+    prefetch_queries = [ticker_query(t, c) for t, c in ticker_map.items() if t != selected_ticker]
+    prefetch_queries = prefetch_queries[:PREFETCH_MAX_TICKERS]
+    prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS)
+    for i in range(PREFETCH_WORKERS):
+        if prefetch_queries[i::PREFETCH_WORKERS]:
+            prefetch_pool.submit(prefetch_news, prefetch_queries[i::PREFETCH_WORKERS], from_iso, to_iso,
+                                 max_pages, page_size)
+    prefetch_pool.shutdown(wait=False)
 
-st.subheader(f"News for {selected_ticker} — {company_name}")
+# Combining tickers costs one API call per batched query instead of one per ticker
+picked = st.sidebar.multiselect("Combine tickers into one query (saves API quota)", list(ticker_map.keys()))
+if picked:
+    picked_pairs = [(t, ticker_map[t]) for t in picked]
+    view_label = ", ".join(picked)
+    st.subheader(f"News for {view_label}")
+else:
+    view_label = selected_ticker
+    st.subheader(f"News for {selected_ticker} — {company_name}")
 
+# Stream pages in as they arrive so the first results show after one round-trip
+queries = batch_ticker_queries(picked_pairs) if picked else [query]
+placeholder = st.empty()
+articles = []
 try:
-    with st.spinner("Fetching news..."):
-        articles = cached_fetch_news(query, from_iso, to_iso, max_pages, page_size)
+    with st.spinner("Fetching news..."), closing(open_transport()) as transport:
+        for q in queries:
+            for batch in fetch_pages_iter(q, from_iso, to_iso, max_pages, page_size, transport=transport):
+                articles.extend(batch)
+                placeholder.dataframe(pd.DataFrame(articles, columns=ARTICLE_COLUMNS)[['title', 'source', 'publishedAt']])
 except RuntimeError as e:
     st.error(str(e))
     st.stop()
+placeholder.empty()
 
 if not articles:
     st.info("No news articles found for this stock and range.")
 else:
-    df = pd.DataFrame(articles)
-    def parse_date(x):
-        try:
-            return parser.isoparse(x)
-        except Exception:
-            return pd.NaT
-    df['publishedAt_parsed'] = df['publishedAt'].apply(parse_date)
+    df = pd.DataFrame(articles, columns=ARTICLE_COLUMNS)
+    # Syndicated copies of one story would otherwise be parsed, scored and rendered once each.
+    # Rows without a url/title are kept, since they can't be matched reliably.
+    df = df[df['url'].isna() | ~df['url'].duplicated()]
+    title_key = df['title'].str.lower().str.replace(r'\W+', '', regex=True)
+    df = df[title_key.isna() | (title_key == '') | ~title_key.duplicated()]
+    df['publishedAt_parsed'] = pd.to_datetime(df['publishedAt'], utc=True, errors='coerce', format='ISO8601')
     df = df.sort_values('publishedAt_parsed', ascending=False)
+    df['date_str'] = df['publishedAt_parsed'].dt.strftime('%Y-%m-%d %H:%M UTC').fillna('')
 
     if use_sentiment:
-        df['sentiment'] = (df['title'].fillna('') + '. ' + df['description'].fillna('')).apply(simple_sentiment)
-
-    st.success(f"Fetched {len(df)} articles for {selected_ticker} ({company_name})")
-
-    csv = df.to_csv(index=False)
-    st.download_button("📥 Download CSV", csv, file_name=f"{selected_ticker}_news.csv")
-
-    for _, row in df.iterrows():
-        title = row.get('title') or "(No title)"
-        desc = row.get('description') or ""
-        src = row.get('source') or "Unknown"
-        date = row.get('publishedAt_parsed')
-        date_str = date.strftime('%Y-%m-%d %H:%M UTC') if pd.notna(date) else ''
-        link = row.get('url') or ""
-        st.markdown(f"**{title}**")
-        st.caption(f"{src} — {date_str}")
-        if desc:
-            st.write(desc)
-        if link:
-            st.markdown(f"[Read more]({link})")
-        if use_sentiment:
-            st.markdown(f"**Sentiment:** {row.get('sentiment','neutral')}\n")
-        st.divider()
+        df['sentiment'] = vector_sentiment(df['title'].fillna('') + '. ' + df['description'].fillna(''))
+        df['sentiment_color'] = np.select(
+            [df['sentiment'] == 'positive', df['sentiment'] == 'negative'],
+            [SENTIMENT_COLORS['positive'], SENTIMENT_COLORS['negative']],
+            default=SENTIMENT_COLORS['neutral'],
+        )
+
+    if picked:
+        df['ticker'] = tag_tickers(df, picked_pairs)
+        st.success(f"Fetched {len(df)} articles for {view_label}")
+    else:
+        st.success(f"Fetched {len(df)} articles for {selected_ticker} ({company_name})")
+
+    # Serialising the CSV on every rerun is wasted work unless the user actually wants it
+    csv_key = (tuple(queries), from_iso, to_iso, max_pages, page_size, use_sentiment)
+    if st.session_state.get("csv_key") != csv_key:
+        st.session_state.pop("csv", None)
+    if st.button("Prepare CSV"):
+        csv_cols = ARTICLE_COLUMNS + (['sentiment'] if use_sentiment else []) + (['ticker'] if picked else [])
+        st.session_state["csv"] = dataframe_to_csv(df[csv_cols])
+        st.session_state["csv_key"] = csv_key
+    if "csv" in st.session_state:
+        st.download_button("📥 Download CSV", st.session_state["csv"], file_name=f"{view_label.replace(', ', '_')}_news.csv")
+
+    display_cols = ['title', 'description', 'source', 'date_str', 'url'] + (['sentiment', 'sentiment_color'] if use_sentiment else [])
+    if picked:
+        display_cols.append('ticker')
+    records = df[display_cols].to_dict(orient='records')
+    # One markdown element for the whole list instead of ~6 Streamlit calls per article
+    st.markdown("\n".join(article_html(row, use_sentiment) for row in records), unsafe_allow_html=True)
 
 st.markdown("---")
 st.caption("App auto-fetches GNews results for small-cap NSE stocks based on selected range.")